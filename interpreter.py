@@ -1,9 +1,27 @@
 import enum
+import json
+import mmap
+import operator
+import os
+import pickle
+import re
 import sys
-from typing import Any, SupportsIndex, Type
+import threading
+from array import array
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from contextlib import contextmanager, redirect_stdout
+from functools import lru_cache
+from io import StringIO
+from itertools import repeat
+from time import perf_counter_ns
+from typing import Any, Callable, SupportsIndex, Type
 from pathlib import Path
 from random import randint
 
+try: import numpy as np
+except ImportError: np = None
+
 
 ####### CONTROL TAGS #######
 # "@IN": user input
@@ -14,10 +32,35 @@ from random import randint
 # "@LIST": creates a new linked list
 # "@ARRAY:[length]:[type?]: creates a new array with the given length and an optional type constraint"
 # "@LEN:[variable/object]": returns the length of the given variable/object/etc
+# "@SUM:[array]", "@MIN:[array]", "@MAX:[array]", "@MEAN:[array]": reduces the given array to a single value
 ############################
 
 
 
+#### CONSTANTS ####
+
+# operators that can be applied element-wise to arrays
+ARRAY_OPERATORS = {
+    '+': operator.add, '-': operator.sub, '*': operator.mul, '**': operator.pow,
+    '/': operator.truediv, '//': operator.floordiv, '%': operator.mod,
+    '&': operator.and_, '|': operator.or_, '^': operator.xor,
+    '==': operator.eq, '!=': operator.ne, '>': operator.gt, '<': operator.lt
+}
+COMPARISON_OPERATORS = ('==', '!=', '>', '<')
+
+# type constraints that can be given to '@ARRAY'
+ARRAY_TYPES = {'int': int, 'float': float, 'str': str, 'bool': bool}
+
+# type constraints that are backed by a numpy array when numpy is available
+BATCHED_ARRAY_TYPES = (int, float)
+
+# largest value a numpy backed int array can hold
+INT64_MAX = 2**63 - 1
+
+#### END CONSTANTS ####
+
+
+
 #### FUNCTIONS ####
 
 def strsub(string: str, start: int, end_at: int = None) -> str:
@@ -36,6 +79,31 @@ def revstrsub(string: str, start: int, end_at: int = None, return_as_tuple: bool
     return string[0:start] + string[end_at:len(string)]
 
 
+def magnitude(values: Any) -> int:
+    'Returns the largest absolute value of a numpy int array or an int'
+    if np is not None and isinstance(values, np.ndarray):
+        if not len(values): return 0
+        return max(abs(int(values.max())), abs(int(values.min())))
+    return abs(values)
+
+
+def fits_int64(op: str, lhs: Any, rhs: Any) -> bool:
+    'Returns whether applying `op` to the int values `lhs` and `rhs` is guaranteed not to overflow a 64-bit int'
+    match op:
+        case '+' | '-': return magnitude(lhs) + magnitude(rhs) <= INT64_MAX
+        case '*': return magnitude(lhs) * magnitude(rhs) <= INT64_MAX
+        case '**':
+            base = magnitude(lhs)
+            return base <= 1 or base.bit_length() * magnitude(rhs) < 63
+        case _: return magnitude(lhs) < INT64_MAX and magnitude(rhs) < INT64_MAX
+
+
+def report_error(err: 'Error', errors: list['Error'] | None):
+    'Prints an error, and adds it to `errors` if given'
+    print(err.error())
+    if errors is not None: errors.append(err)
+
+
 def append_file(filename: str | Path, data: Any):
     with open(filename, 'at') as f:
         f.write(str(data))
@@ -73,7 +141,7 @@ class PlentranFunction:
         self.__name = name
         self.__code = code
     
-    def run(self): return run_pet(self.__code, is_function=True)
+    def run(self): return run_pet('\n'.join(self.__code), is_function=True)
 
 
 
@@ -87,10 +155,38 @@ class Array:
     def __init__(self, size: int = None, typeof: Type = __NoType, *inital_values: Any):
         if size: self.__size: int = size
         else:
-            if inital_values: self.__arr = list(inital_values); self.__size: int = len(self.__arr)
+            if inital_values: self.__size: int = len(inital_values)
             else: self.__size: int = 10
         self.__typeof = typeof
-        self.__arr: list[Any] = [self.__typeof() for _ in range(self.__size)]
+        arr = list(inital_values[:self.__size])
+        arr += [self.__typeof() for _ in range(self.__size - len(arr))]
+        self.__store(arr)
+
+    def __store(self, values: Any):
+        'Sets the backing storage of the array, which is a numpy array if the type constraint allows it and numpy is available'
+        if np is not None and self.__typeof in BATCHED_ARRAY_TYPES:
+            try:
+                self.__arr = np.asarray(values, dtype=self.__typeof)
+                return
+            except OverflowError: pass # ints too big for numpy, so fall back to a list
+        if np is not None and isinstance(values, np.ndarray): self.__arr: list[Any] = values.tolist()
+        else: self.__arr: list[Any] = list(values)
+
+    def __is_batched(self) -> bool: return np is not None and isinstance(self.__arr, np.ndarray)
+
+    def __items(self) -> list[Any]:
+        'Returns the items of the array as a list'
+        if self.__is_batched(): return self.__arr.tolist()
+        return self.__arr
+
+    @classmethod
+    def __from_values(cls, typeof: Type, values: Any):
+        'Creates an array directly from an already built list or numpy array'
+        arr = cls.__new__(cls)
+        arr.__size = len(values)
+        arr.__typeof = typeof
+        arr.__store(values)
+        return arr
     
     def len(self):
         'Returns the amount of currently assigned indexes'
@@ -102,7 +198,7 @@ class Array:
 
     def index(self, value: Any, start: SupportsIndex = 0, stop: SupportsIndex = sys.maxsize):
         'Return first index of value.\n\nRaises ValueError if the value is not present.'
-        return self.__arr.index(value, start, stop)
+        return self.__items().index(value, start, stop)
     
     def get(self, index: int):
         'Return item at given index.\n\nRaises IndexError if the index is out of bounds.\n\nIf the item at index is not assigned and the array has a type constraint,\n\nthen the zero value of that type is returned;\n\notherwise raises IndexError.'
@@ -110,6 +206,7 @@ class Array:
         if index > len(self.__arr):
             if self.__typeof != self.__NoType: return self.__typeof()
             else: raise IndexError(f"{index} is outside the bounds of the assigned indexes")
+        if self.__is_batched(): return self.__arr[index].item()
         return self.__arr[index]
     
     def set(self, index: int, value: Any):
@@ -125,6 +222,11 @@ class Array:
             else: raise IndexError(f"{index} is outside the bounds of the assigned indexes")
         if self.__typeof != self.__NoType and not isinstance(value, self.__typeof):
             raise ValueError(f"can not assign type of '{type(value).__name__}' to an array with a type constraint of '{self.__typeof.__name__}'")
+        if self.__is_batched():
+            try:
+                self.__arr[index] = value
+                return
+            except OverflowError: self.__arr = self.__arr.tolist() # int too big for numpy, so fall back to a list
         self.__arr[index] = value
     
     def copy(self, new_arr_size: int = None, new_array_type_constraint: Type = __NoType):
@@ -134,11 +236,72 @@ class Array:
         '''
         if new_arr_size == None: new_arr_size = self.__size
         if not new_array_type_constraint: new_array_type_constraint = self.__typeof
-        return Array(new_arr_size, new_array_type_constraint, *self.__arr)
+        return Array(new_arr_size, new_array_type_constraint, *self.__items())
+
+    def elementwise(self, op: str, other: Any, swapped: bool = False):
+        '''Applies `op` between every item of the array and `other`, which is either a single value or an array of the same size.\n
+        If `swapped` is `True`, then `other` is used as the left-hand side of the operation.\n
+        Comparisons return an array with a type constraint of `bool`,
+        and dividing an `int` array or combining it with a `float` returns one with a type constraint of `float`;
+        otherwise the type constraint of this array is kept.\n
+        Raises ValueError if the array sizes don't match or if a result doesn't fit the type constraint'''
+        func = ARRAY_OPERATORS[op]
+
+        if isinstance(other, Array):
+            if other.__size != self.__size:
+                raise ValueError(f"can not apply '{op}' to arrays of size {self.__size} and {other.__size}")
+            other_type = other.__typeof
+            batched = self.__is_batched() and other.__is_batched()
+            other_values = other.__arr
+        else:
+            other_type = type(other)
+            batched = self.__is_batched() and other_type in BATCHED_ARRAY_TYPES
+            other_values = other
+
+        if op in COMPARISON_OPERATORS: typeof = bool
+        elif self.__typeof is int and (op == '/' or other_type is float): typeof = float
+        else: typeof = self.__typeof
+
+        if batched:
+            lhs, rhs = (other_values, self.__arr) if swapped else (self.__arr, other_values)
+            # results that could overflow numpy's ints are worked out with python ints instead
+            if typeof is int and not fits_int64(op, lhs, rhs): batched = False
+
+        if batched:
+            with np.errstate(all='raise'): values = func(lhs, rhs)
+        else:
+            if isinstance(other, Array): other_values = other.__items()
+            else: other_values = repeat(other_values)
+            lhs, rhs = (other_values, self.__items()) if swapped else (self.__items(), other_values)
+            values = list(map(func, lhs, rhs))
+            if typeof != self.__NoType:
+                for v in values:
+                    if not isinstance(v, typeof):
+                        raise ValueError(f"can not assign type of '{type(v).__name__}' to an array with a type constraint of '{typeof.__name__}'")
+
+        return Array.__from_values(typeof, values)
+
+    def reduce(self, op: str) -> Any:
+        '''Reduces the array to a single value, `op` can be 'sum', 'min', 'max' or 'mean'.\n
+        Raises TypeError if the items of the array can't be reduced and ArithmeticError if the result can't be represented'''
+        if self.__is_batched():
+            match op:
+                case 'sum':
+                    if self.__typeof is int and magnitude(self.__arr) * len(self.__arr) > INT64_MAX: return sum(self.__items())
+                    with np.errstate(all='ignore'): return self.__arr.sum().item()
+                case 'min': return self.__arr.min().item()
+                case 'max': return self.__arr.max().item()
+                case 'mean': return self.reduce('sum') / len(self.__arr)
+        match op:
+            case 'sum': return sum(self.__arr)
+            case 'min': return min(self.__arr)
+            case 'max': return max(self.__arr)
+            case 'mean': return sum(self.__arr) / len(self.__arr)
+        raise ValueError(f"unknown reduction '{op}'")
 
     def __repr__(self):
         arr = []
-        for i in self.__arr:
+        for i in self.__items():
             if isinstance(i, self.__NoType): arr.append('[NoType]')
             else: arr.append(f"{type(i).__name__}({i})")
         out = ', '.join(arr)
@@ -147,6 +310,234 @@ class Array:
         return out
 
 
+class JumpTables:
+
+    '''
+    The positions of the if statements and while loops of Plentran code, filled in one line at a time.\n
+    `table_type` is used to create each jump table
+    '''
+    def __init__(self, table_type: Callable[[], dict[int, int]] = dict):
+        self.if_to_else = table_type()
+        self.if_to_endif = table_type()
+        self.else_to_endif = table_type()
+
+        self.while_to_endwhile = table_type()
+        self.endwhile_to_while = table_type()
+
+        self.else_index_stack: list[int] = []
+        self.if_index_stack: list[list[int, bool]] = []
+
+        self.while_index_stack: list[int] = []
+
+    def add(self, ln: int, l: str):
+        'Adds the line at `ln` to the jump tables'
+        if l.startswith('if ') and l.endswith(' then'):
+            self.if_index_stack.append([ln, False])
+        elif l == 'else do':
+            self.else_index_stack.append(ln)
+            self.if_index_stack[-1][1] = True
+        elif l == 'endif' and len(self.if_index_stack):
+            if_idx, has_else = self.if_index_stack.pop()
+            self.if_to_endif[if_idx] = ln
+            if has_else:
+                else_idx = self.else_index_stack.pop()
+                self.if_to_else[if_idx] = else_idx
+                self.else_to_endif[else_idx] = ln
+        elif l.startswith('while ') and l.endswith(' do'):
+            self.while_index_stack.append(ln)
+        elif l == 'breakwhile' and len(self.while_index_stack): pass
+        elif l == 'endwhile' and len(self.while_index_stack):
+            while_idx = self.while_index_stack.pop()
+            self.while_to_endwhile[while_idx] = ln
+            self.endwhile_to_while[ln] = while_idx
+
+    def is_open(self, ln: int) -> bool:
+        'Returns whether the control structure at `ln` has not been closed yet'
+        return ln in self.while_index_stack or ln in self.else_index_stack or any(i[0] == ln for i in self.if_index_stack)
+
+
+
+class ParsedPet:
+
+    '''
+    Plentran code split into lines, along with the positions of its if statements and while loops.\n
+    If `previous` is given and none of the changed lines added, removed or moved a control structure,
+    then the jump tables of `previous` are reused instead of scanning the code again
+    '''
+    def __init__(self, text: str, previous: 'ParsedPet' = None):
+        self.lines = [l.split(';;')[0].strip() for l in text.split('\n')]
+
+        if previous and self.__same_structure(previous): tables = previous
+        else:
+            tables = JumpTables()
+            for ln, l in enumerate(self.lines): tables.add(ln, l)
+
+        self.if_to_else = tables.if_to_else
+        self.if_to_endif = tables.if_to_endif
+        self.else_to_endif = tables.else_to_endif
+        self.while_to_endwhile = tables.while_to_endwhile
+        self.endwhile_to_while = tables.endwhile_to_while
+
+    def __same_structure(self, previous: 'ParsedPet') -> bool:
+        if len(previous.lines) != len(self.lines): return False
+        for old, new in zip(previous.lines, self.lines):
+            if old != new and control_structure_of(old) != control_structure_of(new): return False
+        return True
+
+    def line(self, ln: int) -> str | None:
+        'Returns the line at `ln`, or `None` if it is past the end of the code'
+        if ln < len(self.lines): return self.lines[ln]
+        return None
+
+
+
+class LazyJumpTable(dict):
+
+    '''
+    A jump table that calls `resolve` with a line before looking it up,
+    so the control structure at that line can be scanned on demand
+    '''
+    def __init__(self, resolve: Callable[[int], None]):
+        super().__init__()
+        self.__resolve = resolve
+
+    def __contains__(self, ln: int) -> bool:
+        self.__resolve(ln)
+        return super().__contains__(ln)
+
+    def __getitem__(self, ln: int) -> int:
+        self.__resolve(ln)
+        return super().__getitem__(ln)
+
+
+
+class StreamedPet:
+
+    '''
+    Plentran code that is read from a file while it runs, instead of being loaded and scanned all at once.\n
+    Lines are only indexed when they're run or when the end of an if statement or while loop is looked for,
+    and lines before the outermost running while loop are released, so memory use depends on
+    the size of the running loops rather than the size of the file
+    '''
+    def __init__(self, filename: str | Path, window: int = 4096):
+        self.__file = open(filename, 'rb')
+        try: self.__mm = mmap.mmap(self.__file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError: self.__mm = b'' # empty files can't be mapped
+
+        self.__first = 0 # line number of the first indexed line
+        self.__offsets = array('q') # start offsets of the indexed lines
+        self.__scan_pos = 0
+        self.__done = not len(self.__mm)
+        self.__current = 0
+        self.__window = window
+        self.__release_at = window
+        self.__last_indexed: tuple[int, str] = (-1, '')
+
+        self.__tables = JumpTables(lambda: LazyJumpTable(self.__resolve))
+        self.if_to_else = self.__tables.if_to_else
+        self.if_to_endif = self.__tables.if_to_endif
+        self.else_to_endif = self.__tables.else_to_endif
+        self.while_to_endwhile = self.__tables.while_to_endwhile
+        self.endwhile_to_while = self.__tables.endwhile_to_while
+
+    def __enter__(self): return self
+
+    def __exit__(self, *_): self.close()
+
+    def close(self):
+        if isinstance(self.__mm, mmap.mmap): self.__mm.close()
+        self.__file.close()
+
+    def __read(self, start: int) -> tuple[str, int]:
+        'Returns the line starting at `start` and the offset of its end'
+        end = self.__mm.find(b'\n', start)
+        if end == -1: end = len(self.__mm)
+        return self.__mm[start:end].decode().split(';;')[0].strip(), end
+
+    def __index_line(self) -> bool:
+        'Indexes the next line of the file, returns `False` if the whole file has been indexed'
+        if self.__done: return False
+        start = self.__scan_pos
+        l, end = self.__read(start)
+        self.__scan_pos = end + 1
+        if self.__scan_pos >= len(self.__mm): self.__done = True
+
+        ln = self.__first + len(self.__offsets)
+        self.__offsets.append(start)
+        self.__tables.add(ln, l)
+        self.__last_indexed = (ln, l) # usually the next line to be run, so it doesn't have to be read again
+        return True
+
+    def __resolve(self, ln: int):
+        'Indexes lines until the control structure at `ln` is closed'
+        while self.__tables.is_open(ln) and self.__index_line(): pass
+
+    def __release(self):
+        'Releases lines that can not be run again, which are the ones before the outermost while loop around the current line'
+        low = self.__current
+        for w in self.__tables.while_index_stack:
+            if w < low: low = w
+        for w, e in dict.items(self.while_to_endwhile):
+            if w < low and e >= self.__current: low = w
+
+        if low > self.__first:
+            del self.__offsets[:low - self.__first]
+            self.__first = low
+            for table in (self.if_to_else, self.if_to_endif, self.else_to_endif, self.while_to_endwhile, self.endwhile_to_while):
+                for k in [k for k in dict.keys(table) if k < low]: dict.__delitem__(table, k)
+        self.__release_at = max(2 * len(self.__offsets), self.__window)
+
+    def line(self, ln: int) -> str | None:
+        'Returns the line at `ln`, or `None` if it is past the end of the file'
+        while ln >= self.__first + len(self.__offsets):
+            if not self.__index_line(): return None
+        if ln < self.__first: raise IndexError(f"line {ln} has already been released")
+
+        self.__current = ln
+        if len(self.__offsets) >= self.__release_at: self.__release()
+        if self.__last_indexed[0] == ln: return self.__last_indexed[1]
+        return self.__read(self.__offsets[ln - self.__first])[0]
+
+
+
+class Session:
+
+    '''
+    Interpreter state that lives across runs, so Plentran code can be run against it bit by bit.\n
+    Lines that open an if statement, while loop or program are buffered until the matching end line is given
+    '''
+    def __init__(self):
+        self.vars: dict[str, Any] = {}
+        self.funcs: dict[str, PlentranFunction] = {}
+        self.__buffer: list[str] = []
+        self.__depth = 0
+
+    def feed(self, line: str) -> bool:
+        'Adds a line to the session and runs the buffered lines once they are complete.\n\nReturns `True` if more lines are needed'
+        l = line.split(';;')[0].strip()
+        kind = control_structure_of(l)
+        if kind in ('if', 'while') or l.startswith('#program '): self.__depth += 1
+        elif (kind in ('endif', 'endwhile') or l.startswith('#endprogram ')) and self.__depth: self.__depth -= 1
+
+        self.__buffer.append(line)
+        if self.__depth: return True
+
+        text = '\n'.join(self.__buffer)
+        self.clear()
+        self.run(text)
+        return False
+
+    def clear(self):
+        'Drops any buffered lines'
+        self.__buffer.clear()
+        self.__depth = 0
+
+    def run(self, text: 'str | ParsedPet | StreamedPet', tracer: 'Tracer' = None):
+        'Runs Plentran code against the session'
+        run_pet(text, injected_vars=self.vars, injected_funcs=self.funcs, tracer=tracer)
+
+
+
 class Stack:
     def __init__(self, *initial_values: Any) -> None:
         self.__stack = []
@@ -165,6 +556,61 @@ class Stack:
 
 
 
+class Tracer:
+
+    '''
+    Records timed spans in the Chrome trace event format.\n
+    Only the latest `capacity` spans are kept, so long runs use a bounded amount of memory
+    '''
+    def __init__(self, capacity: int = 100_000):
+        self.__events: deque[dict[str, Any]] = deque(maxlen=capacity)
+        self.__open: list[tuple[str, str, int, dict[str, Any]]] = []
+        self.__start = perf_counter_ns()
+        self.__dropped = 0
+
+    def begin(self, name: str, category: str, **args: Any):
+        'Opens a new span, which is recorded when `end` is called'
+        self.__open.append((name, category, perf_counter_ns(), args))
+
+    def depth(self) -> int:
+        'Returns the amount of currently open spans'
+        return len(self.__open)
+
+    def end(self, depth: int = None):
+        'Closes the latest opened span, or every span opened after `depth` if it is given'
+        if depth == None:
+            if not len(self.__open): raise IndexError('Can not end span as no span is open')
+            depth = len(self.__open) - 1
+        end = perf_counter_ns()
+        while len(self.__open) > depth:
+            name, category, start, args = self.__open.pop()
+            if len(self.__events) == self.__events.maxlen: self.__dropped += 1
+            self.__events.append({
+                'name': name, 'cat': category, 'ph': 'X',
+                'ts': (start - self.__start) / 1000, 'dur': (end - start) / 1000,
+                'pid': os.getpid(), 'tid': threading.get_ident(), 'args': args
+            })
+
+    @contextmanager
+    def span(self, name: str, category: str, **args: Any):
+        self.begin(name, category, **args)
+        try: yield
+        finally: self.end()
+
+    def export(self) -> dict[str, Any]:
+        'Closes any spans left open(e.g. by an error) and returns the recorded trace'
+        self.end(0)
+        return {'traceEvents': list(self.__events), 'displayTimeUnit': 'ms', 'otherData': {'dropped_events': self.__dropped}}
+
+    def save(self, filename: str | Path):
+        with open(filename, 'wt') as f: json.dump(self.export(), f)
+
+
+# the tracer of the current run, 'None' when tracing is disabled
+active_tracer: Tracer | None = None
+
+
+
 class Nil:
     def __repr__(self): return 'Nil'
 
@@ -180,7 +626,9 @@ class Nil:
 
 def get_control_tag(vars: dict[str, Any], funcs: dict[str, PlentranFunction], tag: str, ln: int, program: str) -> tuple[Any, Error | None]:
 
-    if tag == '@IN': return input('input wanted\n'), None
+    if tag == '@IN':
+        if not active_tracer: return input('input wanted\n'), None
+        with active_tracer.span('@IN', 'io'): return input('input wanted\n'), None
 
     if tag == '@FILE': return __file__, None
 
@@ -188,7 +636,7 @@ def get_control_tag(vars: dict[str, Any], funcs: dict[str, PlentranFunction], ta
 
     if tag.startswith('@LEN:'):
         o = tag.removeprefix('@LEN:')
-        o_converted, o_err = get_value(vars, o, ln, program)
+        o_converted, o_err = get_value(vars, funcs, o, ln, program)
         if o_err: return None, o_err
         try:
             return len(o_converted), None
@@ -198,10 +646,10 @@ def get_control_tag(vars: dict[str, Any], funcs: dict[str, PlentranFunction], ta
     if tag.startswith('@RAND:') and tag.count(':') == 2:
         r_min, r_max = tag.removeprefix('@RAND:').split(':')
 
-        min_converted, min_err = get_value(vars, r_min, ln, program)
+        min_converted, min_err = get_value(vars, funcs, r_min, ln, program)
         if min_err: return None, min_err
 
-        max_converted, max_err = get_value(vars, r_max, ln, program)
+        max_converted, max_err = get_value(vars, funcs, r_max, ln, program)
         if max_err: return None, max_err
 
         if not isinstance(min_converted, int): return None, Error('InvalidValueError', f"invalid value '{min_converted}' for control tag 'RAND', minimum must be an int", ln, program)
@@ -211,19 +659,42 @@ def get_control_tag(vars: dict[str, Any], funcs: dict[str, PlentranFunction], ta
 
         return randint(min_converted, max_converted), None
     
-    if tag.startswith('@ARRAY:'): pass
+    if tag.startswith('@ARRAY:'):
+        args = tag.removeprefix('@ARRAY:').split(':')
+        if len(args) > 2: return None, Error('InvalidControlTagError', f"invalid control tag '{tag}'", ln, program)
+
+        size_converted, size_err = get_value(vars, funcs, args[0], ln, program)
+        if size_err: return None, size_err
+        if not isinstance(size_converted, int) or size_converted < 1:
+            return None, Error('InvalidValueError', f"invalid value '{size_converted}' for control tag 'ARRAY', length must be an int greater than 0", ln, program)
+
+        if len(args) == 1: return Array(size_converted), None
+        if args[1] not in ARRAY_TYPES:
+            return None, Error('InvalidValueError', f"invalid type '{args[1]}' for control tag 'ARRAY', type must be one of {', '.join(ARRAY_TYPES)}", ln, program)
+        return Array(size_converted, ARRAY_TYPES[args[1]]), None
+
+    if tag.startswith(('@SUM:', '@MIN:', '@MAX:', '@MEAN:')):
+        tagname, o = tag.removeprefix('@').split(':', 1)
+        o_converted, o_err = get_value(vars, funcs, o, ln, program)
+        if o_err: return None, o_err
+        if not isinstance(o_converted, Array):
+            return None, Error('InvalidValueError', f"invalid value '{o_converted}' for control tag '{tagname}', value must be an array", ln, program)
+        try:
+            return o_converted.reduce(tagname.casefold()), None
+        except (TypeError, ArithmeticError):
+            return None, Error('InvalidValueError', f"can not reduce array '{o}' with control tag '{tagname}'", ln, program)
 
     if tag.startswith('@RUN:'):
         funcname = tag.removeprefix('@RUN:').strip()
         if funcname not in list(funcs):
             return None, Error('UnknownFunctionError', f"unknown function '{funcname}'", ln, program)
-        funcs[funcname].run()
-        
+        if not active_tracer: return funcs[funcname].run(), None
+        with active_tracer.span(funcname, 'function'): return funcs[funcname].run(), None
 
     return None, Error('InvalidControlTagError', f"invalid control tag '{tag}'", ln, program)
 
 
-def get_value(vars: dict[str, Any], value: str, ln: int, program: str) -> tuple[str | float | int | Path | Nil | None, Error | None]:
+def get_value(vars: dict[str, Any], funcs: dict[str, PlentranFunction], value: str, ln: int, program: str) -> tuple[str | float | int | Path | Nil | None, Error | None]:
     if value.startswith('"') and value.endswith('"'):
         return value.removeprefix('"').removesuffix('"'), None
     
@@ -238,7 +709,7 @@ def get_value(vars: dict[str, Any], value: str, ln: int, program: str) -> tuple[
     elif value == '~': return Nil(), None
 
     elif value.startswith('@'):
-        tagval, err = get_control_tag(vars, value, ln, program)
+        tagval, err = get_control_tag(vars, funcs, value, ln, program)
         if err: return None, err
         return tagval, None
     
@@ -248,103 +719,103 @@ def get_value(vars: dict[str, Any], value: str, ln: int, program: str) -> tuple[
 
     elif ' == ' in value:
         r, l = value.split(' == ', 1)
-        expr_res, expr_err = process_expression(vars, r, '==', l, ln, program)
+        expr_res, expr_err = process_expression(vars, funcs, r, '==', l, ln, program)
         if expr_err: return None, expr_err
         return expr_res, None
     
     elif ' != ' in value:
         r, l = value.split(' != ', 1)
-        expr_res, expr_err = process_expression(vars, r, '!=', l, ln, program)
+        expr_res, expr_err = process_expression(vars, funcs, r, '!=', l, ln, program)
         if expr_err: return None, expr_err
         return expr_res, None
     
     elif 'not ' in value:
         l = value.split('not ', 1)
-        expr_res, expr_err = process_expression(vars, '~', 'not', l, ln, program)
+        expr_res, expr_err = process_expression(vars, funcs, '~', 'not', l, ln, program)
         if expr_err: return None, expr_err
         return expr_res, None
     
     elif ' and ' in value:
         r, l = value.split(' and ', 1)
-        expr_res, expr_err = process_expression(vars, r, 'and', l, ln, program)
+        expr_res, expr_err = process_expression(vars, funcs, r, 'and', l, ln, program)
         if expr_err: return None, expr_err
         return expr_res, None
     
     elif ' or ' in value:
         r, l = value.split(' or ', 1)
-        expr_res, expr_err = process_expression(vars, r, 'or', l, ln, program)
+        expr_res, expr_err = process_expression(vars, funcs, r, 'or', l, ln, program)
         if expr_err: return None, expr_err
         return expr_res, None
     
     elif ' < ' in value:
         r, l = value.split(' < ', 1)
-        expr_res, expr_err = process_expression(vars, r, '<', l, ln, program)
+        expr_res, expr_err = process_expression(vars, funcs, r, '<', l, ln, program)
         if expr_err: return None, expr_err
         return expr_res, None
     
     elif ' > ' in value:
         r, l = value.split(' > ', 1)
-        expr_res, expr_err = process_expression(vars, r, '>', l, ln, program)
+        expr_res, expr_err = process_expression(vars, funcs, r, '>', l, ln, program)
         if expr_err: return None, expr_err
         return expr_res, None
     
     elif ' ^ ' in value:
         r, l = value.split(' ^ ', 1)
-        expr_res, expr_err = process_expression(vars, r, '^', l, ln, program)
+        expr_res, expr_err = process_expression(vars, funcs, r, '^', l, ln, program)
         if expr_err: return None, expr_err
         return expr_res, None
 
     elif ' & ' in value:
         r, l = value.split(' & ', 1)
-        expr_res, expr_err = process_expression(vars, r, '&', l, ln, program)
+        expr_res, expr_err = process_expression(vars, funcs, r, '&', l, ln, program)
         if expr_err: return None, expr_err
         return expr_res, None
     
     elif ' | ' in value:
         r, l = value.split(' | ', 1)
-        expr_res, expr_err = process_expression(vars, r, '|', l, ln, program)
+        expr_res, expr_err = process_expression(vars, funcs, r, '|', l, ln, program)
         if expr_err: return None, expr_err
         return expr_res, None
     
     elif ' ** ' in value:
         r, l = value.split(' ** ', 1)
-        expr_res, expr_err = process_expression(vars, r, '**', l, ln, program)
+        expr_res, expr_err = process_expression(vars, funcs, r, '**', l, ln, program)
         if expr_err: return None, expr_err
         return expr_res, None
     
     elif ' / ' in value:
         r, l = value.split(' / ', 1)
-        expr_res, expr_err = process_expression(vars, r, '/', l, ln, program)
+        expr_res, expr_err = process_expression(vars, funcs, r, '/', l, ln, program)
         if expr_err: return None, expr_err
         return expr_res, None
     
     elif ' % ' in value:
         r, l = value.split(' % ', 1)
-        expr_res, expr_err = process_expression(vars, r, '%', l, ln, program)
+        expr_res, expr_err = process_expression(vars, funcs, r, '%', l, ln, program)
         if expr_err: return None, expr_err
         return expr_res, None
     
     elif ' // ' in value:
         r, l = value.split(' // ', 1)
-        expr_res, expr_err = process_expression(vars, r, '//', l, ln, program)
+        expr_res, expr_err = process_expression(vars, funcs, r, '//', l, ln, program)
         if expr_err: return None, expr_err
         return expr_res, None
     
     elif ' * ' in value:
         r, l = value.split(' * ', 1)
-        expr_res, expr_err = process_expression(vars, r, '*', l, ln, program)
+        expr_res, expr_err = process_expression(vars, funcs, r, '*', l, ln, program)
         if expr_err: return None, expr_err
         return expr_res, None
     
     elif ' - ' in value:
         r, l = value.split(' - ', 1)
-        expr_res, expr_err = process_expression(vars, r, '-', l, ln, program)
+        expr_res, expr_err = process_expression(vars, funcs, r, '-', l, ln, program)
         if expr_err: return None, expr_err
         return expr_res, None
     
     elif ' + ' in value:
         r, l = value.split(' + ', 1)
-        expr_res, expr_err = process_expression(vars, r, '+', l, ln, program)
+        expr_res, expr_err = process_expression(vars, funcs, r, '+', l, ln, program)
         if expr_err: return None, expr_err
         return expr_res, None
     
@@ -356,14 +827,19 @@ def get_value(vars: dict[str, Any], value: str, ln: int, program: str) -> tuple[
 
 #### OPERATIONS ####
 
-def process_expression(vars: dict[str, Any], right: str, op: str, left: str, ln: int, program: str) -> tuple[Any, Error | None]:
-    right_converted, right_err = get_value(vars, right, ln, program)
+def process_expression(vars: dict[str, Any], funcs: dict[str, PlentranFunction], right: str, op: str, left: str, ln: int, program: str) -> tuple[Any, Error | None]:
+    right_converted, right_err = get_value(vars, funcs, right, ln, program)
     if right_err: return None, right_err
 
-    left_converted, left_err = get_value(vars, left, ln, program)
+    left_converted, left_err = get_value(vars, funcs, left, ln, program)
     if left_err: return None, left_err
 
     try:
+        if isinstance(right_converted, Array) and op in ARRAY_OPERATORS:
+            return right_converted.elementwise(op, left_converted), None
+        if isinstance(left_converted, Array) and op in ARRAY_OPERATORS:
+            return left_converted.elementwise(op, right_converted, swapped=True), None
+
         match op:
             case '+': return right_converted + left_converted, None
             case '-': return right_converted - left_converted, None
@@ -386,39 +862,64 @@ def process_expression(vars: dict[str, Any], right: str, op: str, left: str, ln:
             case '!=': return right_converted != left_converted, None
             case '>': return right_converted > left_converted, None
             case '<': return right_converted < left_converted, None
-    except ValueError as e: return None, Error('ExpressionError', e, ln, program)
+    except (ValueError, TypeError, ArithmeticError) as e: return None, Error('ExpressionError', str(e), ln, program)
 
 
-def create_variable(vars: dict[str, Any], varname: str, value: str, ln: int, program: str) -> Error | None:
+def create_variable(vars: dict[str, Any], funcs: dict[str, PlentranFunction], varname: str, value: str, ln: int, program: str) -> Error | None:
     if varname in list(vars):
         return Error('AlreadyDefinedVariableError', f"variable '{varname}' has already been defined", ln, program)
     elif varname == '': return Error('InvalidIdentifierError', "variable identifier can't be empty", ln, program)
     
-    converted, err = get_value(vars, value, ln, program)
+    converted, err = get_value(vars, funcs, value, ln, program)
     if err: return err
 
     vars[varname] = converted
     return None
 
 
-def assign_variable(vars: dict[str, Any], varname: str, value: str, ln: int, program: str) -> Error | None:
+def assign_variable(vars: dict[str, Any], funcs: dict[str, PlentranFunction], varname: str, value: str, ln: int, program: str) -> Error | None:
     if varname not in list(vars):
         return Error('UndefinedVariableError', f"variable '{varname}' has not been defined", ln, program)
     
-    converted, err = get_value(vars, value, ln, program)
+    converted, err = get_value(vars, funcs, value, ln, program)
     if err: return err
 
     vars[varname] = converted
     return None
 
 
-def send_value_to(vars: dict[str, Any], val: str, out: str, ln: int, program: str) -> Error | None:
-    val_converted, val_err = get_value(vars, val, ln, program)
+def set_index(vars: dict[str, Any], funcs: dict[str, PlentranFunction], target: str, value: str, ln: int, program: str) -> Error | None:
+    if ':' not in target: return Error('InvalidValueError', f"invalid index target '{target}', target must be formatted as 'array:index'", ln, program)
+    varname, index = target.split(':', 1)
+    if varname not in list(vars):
+        return Error('UndefinedVariableError', f"variable '{varname}' has not been defined", ln, program)
+    if not isinstance(vars[varname], Array):
+        return Error('InvalidValueError', f"variable '{varname}' is not an array", ln, program)
+
+    index_converted, index_err = get_value(vars, funcs, index, ln, program)
+    if index_err: return index_err
+    if not isinstance(index_converted, int):
+        return Error('InvalidValueError', f"invalid index '{index_converted}', index must be an int", ln, program)
+
+    converted, err = get_value(vars, funcs, value, ln, program)
+    if err: return err
+
+    try:
+        vars[varname].set(index_converted, converted)
+    except (IndexError, ValueError) as e: return Error('ArrayError', str(e), ln, program)
+    return None
+
+
+def send_value_to(vars: dict[str, Any], funcs: dict[str, PlentranFunction], val: str, out: str, ln: int, program: str) -> Error | None:
+    val_converted, val_err = get_value(vars, funcs, val, ln, program)
     if val_err: return val_err
 
-    if out == '@OUT': print(str(val_converted)); return None
+    if out == '@OUT':
+        if not active_tracer: print(str(val_converted)); return None
+        with active_tracer.span('@OUT', 'io'): print(str(val_converted), flush=True)
+        return None
 
-    out_converted, out_err = get_value(vars, out, ln, program)
+    out_converted, out_err = get_value(vars, funcs, out, ln, program)
     if out_err: return out_err
 
     if isinstance(out_converted, str): out_converted = Path(out_converted)
@@ -426,7 +927,9 @@ def send_value_to(vars: dict[str, Any], val: str, out: str, ln: int, program: st
     if isinstance(out_converted, Path):
         if not out_converted.exists():
             return Error('FileNotFoundError', f"file at path '{str(out_converted)}' does not exist", ln, program)
-        append_file(out_converted, val_converted)
+        if not active_tracer: append_file(out_converted, val_converted)
+        else:
+            with active_tracer.span('append', 'io', file=str(out_converted)): append_file(out_converted, val_converted)
         return None
     else: return Error('InvalidValueError', f"invalid value '{out_converted}' for send-to operation", ln, program)
     #return Error('GotToEndOfFunctionError', "got to end of function 'send_value_to'", ln, program)
@@ -445,13 +948,13 @@ def delete_variable(vars: dict[str, Any], funcs: dict[str, PlentranFunction], va
 
 
 def return_value(vars: dict[str, Any], funcs: dict[str, PlentranFunction], value: str, ln: int, program: str) -> tuple[Any, Error | None]:
-    converted, err = get_value(vars, value, ln, program)
+    converted, err = get_value(vars, funcs, value, ln, program)
     if err: return None, err
     return converted, None
 
 
-def process_if(vars: dict[str, Any], statement: str, ln: int, program: str) -> tuple[bool, Error | None]:
-    statement_res, err = get_value(vars, statement, ln, program)
+def process_if(vars: dict[str, Any], funcs: dict[str, PlentranFunction], statement: str, ln: int, program: str) -> tuple[bool, Error | None]:
+    statement_res, err = get_value(vars, funcs, statement, ln, program)
     if err: return False, err
     if statement_res == True: return True, None
     else: return False, None
@@ -462,7 +965,20 @@ def process_if(vars: dict[str, Any], statement: str, ln: int, program: str) -> t
 
 #### MAIN ####
 
-def process_line(vars: dict[str, Any], funcs: dict[str, PlentranFunction], pub_vars_set: set[str], line: str, ln: int, cprog: str, all_programs: list[str]) -> tuple[str, int, Error | None]:
+def control_structure_of(line: str) -> str | None:
+    'Returns which control structure keyword the line is, if any'
+    if line.startswith('if ') and line.endswith(' then'): return 'if'
+    if line.startswith('while ') and line.endswith(' do'): return 'while'
+    if line in ('else do', 'endif', 'breakwhile', 'endwhile'): return line
+    return None
+
+
+@lru_cache(maxsize=65536)
+def tokenize_line(line: str) -> tuple[str, ...]:
+    '''
+    Splits a line into its words, keeping strings intact.\n
+    Results are cached by the text of the line, so loops and re-runs of unchanged code don't split it again
+    '''
     if_statement_cache = None
     if line.startswith('if ') and line.endswith(' then'):
         if_statement_cache = line.removeprefix('if ').removesuffix(' then')
@@ -512,6 +1028,12 @@ def process_line(vars: dict[str, Any], funcs: dict[str, PlentranFunction], pub_v
     # remove any trailing or leading whitespace that may be left over from something
     for i in range(len(l)): l[i] = l[i].strip()
 
+    return tuple(l)
+
+
+def process_line(vars: dict[str, Any], funcs: dict[str, PlentranFunction], pub_vars_set: set[str], line: str, ln: int, cprog: str, all_programs: list[str]) -> tuple[str, int, Error | None]:
+    l = tokenize_line(line)
+
     # line pattern match
     valid = False
     match l:
@@ -533,22 +1055,27 @@ def process_line(vars: dict[str, Any], funcs: dict[str, PlentranFunction], pub_v
         #    valid = True
 
         case ('define', var):
-            err = create_variable(vars, l[1], '~', ln, cprog)
+            err = create_variable(vars, funcs, l[1], '~', ln, cprog)
             if err: return '', 0, err
             valid = True
 
         case ('define', var, 'as', val):
-            err = create_variable(vars, l[1], l[3], ln, cprog)
+            err = create_variable(vars, funcs, l[1], l[3], ln, cprog)
             if err: return '', 0, err
             valid = True
         
         case ('assign', var, 'with', val):
-            err = assign_variable(vars, l[1], l[3], ln, cprog)
+            err = assign_variable(vars, funcs, l[1], l[3], ln, cprog)
+            if err: return '', 0, err
+            valid = True
+
+        case ('setindex', target, 'as', val):
+            err = set_index(vars, funcs, l[1], l[3], ln, cprog)
             if err: return '', 0, err
             valid = True
 
         case ('send', val, 'to', out):
-            err = send_value_to(vars, l[1], l[3], ln, cprog)
+            err = send_value_to(vars, funcs, l[1], l[3], ln, cprog)
             if err: return '', 0, err
             valid = True
 
@@ -558,14 +1085,14 @@ def process_line(vars: dict[str, Any], funcs: dict[str, PlentranFunction], pub_v
             valid = True
         
         case ('if', statement, 'then'):
-            if_res, err = process_if(vars, if_statement_cache, ln, cprog)
+            if_res, err = process_if(vars, funcs, l[1], ln, cprog)
             if err: return '', 0, err
             if if_res: return '', 3, None
             return '', 2, None
             #valid = True
         
         case ('while', statement, 'do'):
-            while_res, err = process_if(vars, while_loop_cache, ln, cprog)
+            while_res, err = process_if(vars, funcs, l[1], ln, cprog)
             if err: return '', 0, err
             if while_res: return '', 0, None
             return '', 4, None
@@ -589,11 +1116,15 @@ def process_line(vars: dict[str, Any], funcs: dict[str, PlentranFunction], pub_v
     
     if len(l) >= 4 and not valid:
         if l[0] == 'define' and l[2] == 'as':
-            err = create_variable(vars, l[1], ' '.join([i for n, i in enumerate(l) if n > 2]), ln, cprog)
+            err = create_variable(vars, funcs, l[1], ' '.join([i for n, i in enumerate(l) if n > 2]), ln, cprog)
             if err: return '', 0, err
             valid = True
         elif l[0] == 'assign' and l[2] == 'with':
-            err = assign_variable(vars, l[1], ' '.join([i for n, i in enumerate(l) if n > 2]), ln, cprog)
+            err = assign_variable(vars, funcs, l[1], ' '.join([i for n, i in enumerate(l) if n > 2]), ln, cprog)
+            if err: return '', 0, err
+            valid = True
+        elif l[0] == 'setindex' and l[2] == 'as':
+            err = set_index(vars, funcs, l[1], ' '.join([i for n, i in enumerate(l) if n > 2]), ln, cprog)
             if err: return '', 0, err
             valid = True
     
@@ -602,49 +1133,41 @@ def process_line(vars: dict[str, Any], funcs: dict[str, PlentranFunction], pub_v
 
 
 
-def run_pet(text: str, is_function: bool = False, is_imported: bool = False, main_program_name: str = '<main>', injected_vars: dict[str, Any] = None, injected_funcs: dict[str, PlentranFunction] = None) -> None | dict[str, Any]:
-    #lines = [l.split(';;')[0].strip() for l in text.split('\n') if not l.startswith(';;') and l.strip() != '']
-    #lines = [l for l in lines if l != '']
+def run_pet(text: 'str | ParsedPet | StreamedPet', is_function: bool = False, is_imported: bool = False, main_program_name: str = '<main>', injected_vars: dict[str, Any] = None, injected_funcs: dict[str, PlentranFunction] = None, tracer: Tracer = None, errors: list[Error] = None) -> None | dict[str, Any]:
+    '''
+    Runs Plentran code.\n
+    If `tracer` is given, then programs, function calls, imports and I/O are recorded to it
+    for this run and any runs started from it.\n
+    If `errors` is given, then the error that stopped the run(if any) is added to it as well as being printed
+    '''
+    global active_tracer
+    if tracer:
+        previous_tracer, active_tracer = active_tracer, tracer
+        try: return run_pet(text, is_function, is_imported, main_program_name, injected_vars, injected_funcs, errors=errors)
+        finally: active_tracer = previous_tracer
 
-    
+    if not active_tracer: return execute_pet(text, is_function, is_imported, main_program_name, injected_vars, injected_funcs, errors=errors)
 
-    lines = [l.split(';;')[0].strip() for l in text.split('\n')]
+    depth = active_tracer.depth()
+    if is_imported: active_tracer.begin(main_program_name, 'import')
+    try: return execute_pet(text, is_function, is_imported, main_program_name, injected_vars, injected_funcs, errors=errors)
+    finally: active_tracer.end(depth) # also closes any program spans left open by an error
 
-    if_to_else = {}
-    if_to_endif = {}
-    else_to_endif = {}
 
-    while_to_endwhile = {}
-    breakwhile_to_endwhile = {}
-    endwhile_to_while = {}
+def execute_pet(text: 'str | ParsedPet | StreamedPet', is_function: bool = False, is_imported: bool = False, main_program_name: str = '<main>', injected_vars: dict[str, Any] = None, injected_funcs: dict[str, PlentranFunction] = None, errors: list[Error] = None) -> None | dict[str, Any]:
+    #lines = [l.split(';;')[0].strip() for l in text.split('\n') if not l.startswith(';;') and l.strip() != '']
+    #lines = [l for l in lines if l != '']
 
-    # get if-else-endif and while-endwhile positions
-    else_index_stack: list[int] = []
-    if_index_stack: list[list[int, bool]] = []
+    
 
-    while_index_stack: list[int] = []
-    breakwhile_index_stack: list[int] = []
+    parsed = text if isinstance(text, (ParsedPet, StreamedPet)) else ParsedPet(text)
 
-    for ln, l in enumerate(lines):
-        if l.startswith('if ') and l.endswith(' then'):
-            if_index_stack.append([ln, False])
-        elif l == 'else do':
-            else_index_stack.append(ln)
-            if_index_stack[-1][1] = True
-        elif l == 'endif' and len(if_index_stack):
-            if_idx, has_else = if_index_stack.pop()
-            if_to_endif[if_idx] = ln
-            if has_else:
-                else_idx = else_index_stack.pop()
-                if_to_else[if_idx] = else_idx
-                else_to_endif[else_idx] = ln
-        elif l.startswith('while ') and l.endswith(' do'):
-            while_index_stack.append(ln)
-        elif l == 'breakwhile' and len(while_index_stack): pass
-        elif l == 'endwhile' and len(while_index_stack):
-            while_idx = while_index_stack.pop()
-            while_to_endwhile[while_idx] = ln
-            endwhile_to_while[ln] = while_idx
+    if_to_else = parsed.if_to_else
+    if_to_endif = parsed.if_to_endif
+    else_to_endif = parsed.else_to_endif
+
+    while_to_endwhile = parsed.while_to_endwhile
+    endwhile_to_while = parsed.endwhile_to_while
 
 
     all_programs = [main_program_name]
@@ -653,9 +1176,9 @@ def run_pet(text: str, is_function: bool = False, is_imported: bool = False, mai
  
     public_vars_set: set[str] = set()
 
-    vars: dict[str, Any] = injected_vars if injected_vars else {}
+    vars: dict[str, Any] = injected_vars if injected_vars is not None else {}
 
-    funcs: dict[str, PlentranFunction] = injected_funcs if injected_funcs else {}
+    funcs: dict[str, PlentranFunction] = injected_funcs if injected_funcs is not None else {}
 
     #collect_lines = False
     #collected_lines = []
@@ -669,47 +1192,49 @@ def run_pet(text: str, is_function: bool = False, is_imported: bool = False, mai
 
     to_be_returned: Nil | Error | Any = Nil()
 
-    # if ln not in list(if_to_else): print(Error('IfStatementError', f"could not index ", ln, programs[-1]).error()); return
+    # if ln not in if_to_else: print(Error('IfStatementError', f"could not index ", ln, programs[-1]).error()); return
 
     ln = 0
-    while ln < len(lines):
-        l = lines[ln]
+    while (l := parsed.line(ln)) is not None:
         #print(ln, l)
         if l == '' or l.startswith(';;'): ln += 1; continue
 
         if l == 'endif' and ignore_next_endif: ignore_next_endif = False; ln += 1; continue
 
         if l == 'else do' and should_jump_to_endif_from_else:
-            if ln not in list(else_to_endif): print(Error('IfStatementError', f"could not index of 'else->end'", ln, programs[-1]).error()); return
+            if ln not in else_to_endif: report_error(Error('IfStatementError', f"could not index of 'else->end'", ln, programs[-1]), errors); return
             should_jump_to_endif_from_else = False
             ln = else_to_endif[ln] + 1; continue
         
         if l == 'endwhile' and jump_back_to_while_from_endwhile: ln = endwhile_to_while[ln]; continue
 
         common_line_output, exitcode, err = process_line(vars, funcs, public_vars_set, l, ln+1, programs[-1], all_programs)
-        if err: print(err.error()); return
+        if err: report_error(err, errors); return
 
         if exitcode == 1:
             programs.append(common_line_output)
             all_programs.append(common_line_output)
+            if active_tracer: active_tracer.begin(common_line_output, 'program', line=ln+1)
 
-        elif exitcode == -1: programs.pop()
+        elif exitcode == -1:
+            programs.pop()
+            if active_tracer: active_tracer.end()
 
         elif exitcode == 2:
-            if ln not in list(if_to_else):
-                if ln not in list(if_to_endif): print(Error('IfStatementError', f"could not index 'if->else' nor 'if->endif'", ln, programs[-1]).error()); return
+            if ln not in if_to_else:
+                if ln not in if_to_endif: report_error(Error('IfStatementError', f"could not index 'if->else' nor 'if->endif'", ln, programs[-1]), errors); return
                 else: ln = if_to_endif[ln]
             else: ln = if_to_else[ln]; ignore_next_endif = True
 
         elif exitcode == 3:
-            if ln in list(if_to_else): should_jump_to_endif_from_else = True
+            if ln in if_to_else: should_jump_to_endif_from_else = True
             else: ignore_next_endif = True
 
         elif exitcode == 4:
-            if ln not in list(while_to_endwhile): print(Error('WhileLoopError', f"could not index 'while->endwhile'", ln, programs[-1]).error()); return
+            if ln not in while_to_endwhile: report_error(Error('WhileLoopError', f"could not index 'while->endwhile'", ln, programs[-1]), errors); return
             ln = while_to_endwhile[ln]
 
-        elif exitcode != 0: print(Error('InterpreterError', f"program exit code should be in range -1 to 2(inclusive), but it was '{exitcode}' instead", ln, programs[-1]).error()); return
+        elif exitcode != 0: report_error(Error('InterpreterError', f"program exit code should be in range -1 to 2(inclusive), but it was '{exitcode}' instead", ln, programs[-1]), errors); return
         
         ln += 1
 
@@ -732,23 +1257,208 @@ def run_pet(text: str, is_function: bool = False, is_imported: bool = False, mai
 
 
 
-#### PLENTRAN HEADER FILE STUFF ####
+#### PARALLEL ####
 
-def load_plentran_header(filepath: str, ln: int, program: str) -> tuple[set[str], Error | None]:
-    if not Path(filepath).exists(): return [], Error('FileNotFoundError', f"file at path '{str(filepath)}' does not exist", ln, program)
-    with open(filepath, 'rt') as file: fcontent = file.read()
+# words that are never variable names
+KEYWORDS = {
+    'define', 'as', 'assign', 'with', 'setindex', 'send', 'to', 'delete',
+    'if', 'then', 'else', 'do', 'endif', 'while', 'endwhile', 'breakwhile',
+    'true', 'false', 'not', 'and', 'or'
+}
+STRING_PATTERN = re.compile(r'"(?:\\.|[^"\\])*"')
 
 
-#### END PLENTRAN HEADER STUFF ####
+def words_of(token: str) -> list[str]:
+    'Splits a token into the words `get_value` looks at, emptying strings and splitting control tag arguments and indexes off'
+    words = STRING_PATTERN.sub('""', token).split(' ')
+    return [p for w in words for p in ([w] if w.startswith('f#') else w.split(':'))]
+
+
+def is_variable_name(word: str) -> bool:
+    'Returns whether `get_value` would look the word up as a variable, rather than as a keyword, operator, literal, control tag or path'
+    if word == '' or word == '~' or word.isdigit() or word.startswith(('"', '@', 'f#')): return False
+    return word not in KEYWORDS and word not in ARRAY_OPERATORS
+
+
+class ProgramBlock:
+
+    '''
+    A top-level '#program' block, or the code between two of them, along with the variables it uses.\n
+    A block is `external` if it reads input, sends values anywhere but '@OUT'(e.g. appends to a file)
+    or has a statement that can't be analyzed. `aliases` are the pairs of variables it makes point to the same value
+    '''
+    def __init__(self, start: int, lines: list[str]):
+        self.start = start
+        self.lines = lines
+        self.names: set[str] = set()
+        self.writes: set[str] = set()
+        self.aliases: set[tuple[str, str]] = set()
+        self.external = False
+        for l in lines: self.__analyze(l)
+
+    def __analyze(self, line: str):
+        if line == '': return
+        l = tokenize_line(line)
+        if l[0] in ('#program', '#endprogram'): return
+
+        words = [w for t in l for w in words_of(t)]
+        self.names.update(w for w in words if is_variable_name(w))
+        if '@IN' in words or '@RUN' in words: self.external = True
+        if len(l) == 4 and l[0] in ('define', 'assign') and words_of(l[3]) == [l[3]] and is_variable_name(l[3]):
+            self.aliases.add((l[1], l[3]))
+
+        match l[0]:
+            case 'define' | 'assign' | 'delete' if len(l) > 1: self.writes.add(l[1])
+            case 'setindex' if len(l) > 1: self.writes.add(l[1].split(':')[0])
+            case 'send': self.external = self.external or l[-1] != '@OUT'
+            case 'if' | 'else' | 'endif' | 'while' | 'endwhile' | 'breakwhile': pass
+            case _: self.external = True
+
+    def is_empty(self) -> bool: return all(l == '' for l in self.lines)
+
+    def add_aliases(self, groups: dict[str, set[str]]):
+        'Widens the names and writes of the block to every variable that may share a value with one of them'
+        self.names.update(*(groups[n] for n in list(self.names) if n in groups))
+        self.writes.update(*(groups[n] for n in list(self.writes) if n in groups))
+
+    def conflicts_with(self, other: 'ProgramBlock') -> bool:
+        'Returns whether one of the blocks writes a variable that the other uses'
+        return bool(self.writes & other.names or other.writes & self.names)
+
+    def text(self) -> str:
+        'Returns the code of the block, padded so that line numbers match the original file'
+        return '\n' * self.start + '\n'.join(self.lines)
+
+
+def split_program_blocks(lines: list[str]) -> list[ProgramBlock] | None:
+    '''
+    Splits lines of Plentran code into top-level blocks, cutting only where no if statement, while loop or program is open.\n
+    Returns `None` if a program name is used more than once, as that has to be reported by a sequential run
+    '''
+    blocks: list[ProgramBlock] = []
+    program_names: set[str] = set()
+    start = 0
+    program_depth = 0
+    structure_depth = 0
+
+    for ln, l in enumerate(lines):
+        kind = control_structure_of(l)
+        if l.startswith('#program '):
+            name = l.removeprefix('#program ').strip()
+            if name in program_names: return None
+            program_names.add(name)
+            if program_depth == 0 and structure_depth == 0 and ln > start:
+                blocks.append(ProgramBlock(start, lines[start:ln])); start = ln
+            program_depth += 1
+        elif l.startswith('#endprogram ') and program_depth:
+            program_depth -= 1
+            if program_depth == 0 and structure_depth == 0:
+                blocks.append(ProgramBlock(start, lines[start:ln+1])); start = ln+1
+        elif kind in ('if', 'while'): structure_depth += 1
+        elif kind in ('endif', 'endwhile') and structure_depth: structure_depth -= 1
+
+    if start < len(lines): blocks.append(ProgramBlock(start, lines[start:]))
+    return [b for b in blocks if not b.is_empty()]
+
+
+def alias_groups(blocks: list[ProgramBlock], vars: dict[str, Any]) -> dict[str, set[str]]:
+    '''
+    Groups the names of variables that may point to the same mutable value(e.g. an array that one of them changes with 'setindex'),
+    either because they already do in `vars` or because one of the blocks defines or assigns one with the other
+    '''
+    pairs = [p for b in blocks for p in b.aliases]
+    first_names: dict[int, str] = {}
+    for n, v in vars.items():
+        if v is None or isinstance(v, (str, int, float, Path, Nil)): continue
+        pairs.append((n, first_names.setdefault(id(v), n)))
+
+    groups: dict[str, set[str]] = {}
+    for a, b in pairs:
+        group = groups.get(a, {a}) | groups.get(b, {b})
+        for n in group: groups[n] = group
+    return groups
+
 
+def run_block(text: str, vars: dict[str, Any]) -> tuple[str, dict[str, Any], bool]:
+    'Runs Plentran code, returning what it printed, its variables afterwards and whether it failed'
+    errors: list[Error] = []
+    out = StringIO()
+    with redirect_stdout(out): run_pet(text, injected_vars=vars, errors=errors)
+    return out.getvalue(), vars, bool(errors)
 
 
+def run_pet_parallel(text: 'str | ParsedPet', max_workers: int = None, injected_vars: dict[str, Any] = None):
+    '''
+    Runs Plentran code like `run_pet`, but top-level '#program' blocks that don't share variables are run at the same time
+    in a process pool. Output is printed in the same order as a sequential run, and the run stops at the first error.\n
+    External blocks(see `ProgramBlock`) are run in this process once every block before them has finished
+    '''
+    parsed = text if isinstance(text, ParsedPet) else ParsedPet(text)
+    vars: dict[str, Any] = injected_vars if injected_vars is not None else {}
+
+    blocks = split_program_blocks(parsed.lines)
+    if blocks is None or len(blocks) < 2: run_pet(parsed, injected_vars=vars); return
+
+    # widen blocks to whole alias groups, so that a block changing one name of a group waits for, and is waited on by,
+    # every block using another, and a snapshot carries the whole group to keep the shared value shared after the merge
+    groups = alias_groups(blocks, vars)
+    for block in blocks: block.add_aliases(groups)
+    deps = [{i for i in range(j) if blocks[i].conflicts_with(blocks[j])} for j in range(len(blocks))]
+
+    pending = list(range(len(blocks)))
+    running: dict[Any, tuple[int, dict[str, Any]]] = {}
+    done: set[int] = set()
+    outputs: dict[int, tuple[str, bool]] = {}
+    next_output = 0
+    failed = False
+
+    with ProcessPoolExecutor(max_workers) as pool:
+        while not failed and (pending or running):
+            for j in list(pending):
+                block = blocks[j]
+                if block.external:
+                    if next_output != j: continue
+                    pending.remove(j)
+                    errors: list[Error] = []
+                    run_pet(block.text(), injected_vars=vars, errors=errors)
+                    done.add(j); next_output += 1
+                    if errors: failed = True; break
+                elif deps[j] <= done:
+                    pending.remove(j)
+                    snapshot = {n: vars[n] for n in block.names if n in vars}
+                    running[pool.submit(run_block, block.text(), snapshot)] = (j, snapshot)
+
+            if failed or not running: continue
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                j, snapshot = running.pop(future)
+                try: output, block_vars, block_failed = future.result()
+                except (pickle.PicklingError, AttributeError, TypeError): # values that can't be sent to another process
+                    output, block_vars, block_failed = run_block(blocks[j].text(), snapshot)
+
+                for n in snapshot:
+                    if n not in block_vars: del vars[n]
+                vars.update(block_vars)
+                done.add(j)
+                outputs[j] = (output, block_failed)
+
+            while next_output in outputs:
+                output, block_failed = outputs.pop(next_output)
+                print(output, end='')
+                next_output += 1
+                if block_failed: failed = True; break
+
+        pool.shutdown(cancel_futures=True)
+
+#### END PARALLEL ####
 
-test_array = Array(10)
 
-print(test_array)
 
-test_array.set(0, '*')
-test_array.set(1, '<<<<->>>>')
+#### PLENTRAN HEADER FILE STUFF ####
 
-print(test_array)
\ No newline at end of file
+def load_plentran_header(filepath: str, ln: int, program: str) -> tuple[set[str], Error | None]:
+    if not Path(filepath).exists(): return [], Error('FileNotFoundError', f"file at path '{str(filepath)}' does not exist", ln, program)
+    with open(filepath, 'rt') as file: fcontent = file.read()
+
+
+#### END PLENTRAN HEADER STUFF ####
@@ -1,5 +1,11 @@
-from interpreter import run_pet
+from interpreter import get_value, run_pet, run_pet_parallel, ParsedPet, Session, StreamedPet, Tracer
+from contextlib import contextmanager
 from pathlib import Path
+from time import sleep
+
+
+# files bigger than this are streamed instead of being loaded all at once
+STREAM_THRESHOLD = 64 * 1024 * 1024
 
 
 
@@ -7,6 +13,113 @@ def showhelp():
     print('===commands===')
     print("'help': shows this list")
     print("'run': runs a Plentran file")
+    print("    'run [file] --trace [output]': also saves a Chrome trace of the run to 'output'")
+    print("    'run [file] --parallel': runs top-level programs that don't share variables at the same time")
+    print("    'run [file] --stream': reads the file while it runs instead of loading it first(always done for very big files)")
+    print("'watch': re-runs a Plentran file whenever it or a file it uses changes")
+    print("'repl': starts an interactive session where Plentran statements are run as they're typed")
+    print("    'load [file]': runs a Plentran file in the current session")
+    print("    'exit': leaves the session")
+
+
+
+def get_pet_path(path: str) -> Path | None:
+    'Returns the path of a Plentran file, or `None` if it does not exist'
+    if not path.endswith('.pet'): path += '.pet'
+    path = Path(path)
+    if not path.exists(): print(f"file '{str(path)}' does not exist"); return None
+    return path
+
+
+
+@contextmanager
+def open_pet(path: Path, stream: bool = False):
+    'Gives the code of a Plentran file, which is streamed if `stream` is `True` or the file is bigger than `STREAM_THRESHOLD`'
+    if stream or path.stat().st_size > STREAM_THRESHOLD:
+        with StreamedPet(path) as source: yield source
+    else:
+        with open(path, 'rt') as f: yield ParsedPet(f.read())
+
+
+
+def get_dependencies(text: str, found: list[Path] = None) -> list[Path]:
+    '''
+    Returns the paths of the files that Plentran code imports or is linked to, along with their own dependencies.\n
+    Paths are resolved with `get_value`, so they're relative to the working directory like they are when the code is run
+    '''
+    if found is None: found = []
+    for l in text.split('\n'):
+        l = l.split(';;')[0].strip()
+        for prefix in ('use ', 'linked '):
+            if not l.startswith(prefix): continue
+            dep, err = get_value({}, {}, l.removeprefix(prefix).strip(), 0, '<main>')
+            if err or not isinstance(dep, (str, Path)): continue
+            dep = Path(dep)
+            if dep in found: continue
+            found.append(dep)
+            if dep.is_file():
+                with open(dep, 'rt') as f: get_dependencies(f.read(), found)
+    return found
+
+
+def get_mtimes(paths: list[Path]) -> dict[Path, int]:
+    return {p: p.stat().st_mtime_ns for p in paths if p.exists()}
+
+
+def watch(path: Path, interval: float = 0.05):
+    '''
+    Runs the file at `path` every time it or one of its dependencies changes.\n
+    The last parsed version of the file is kept, so unchanged lines and jump tables are reused between runs
+    '''
+    print(f"watching '{str(path)}', press ctrl+c to stop")
+    parsed = None
+    deps = []
+    mtimes = {}
+    try:
+        while True:
+            # the file can briefly go missing while an editor saves it
+            current_mtimes = get_mtimes([path] + deps)
+            if path.exists() and current_mtimes != mtimes:
+                mtimes = current_mtimes
+                try:
+                    with open(path, 'rt') as f: fcontent = f.read()
+                    parsed = ParsedPet(fcontent, parsed)
+                    deps = get_dependencies(fcontent)
+                    mtimes = get_mtimes([path] + deps)
+                    print(f"=== running '{str(path)}' ===")
+                    run_pet(parsed)
+                except FileNotFoundError: pass
+                except Exception as e: print(f"watch: run failed with {type(e).__name__}: {e}")
+            sleep(interval)
+    except KeyboardInterrupt: print('stopped watching')
+
+
+def repl():
+    '''
+    Runs Plentran statements as they're typed against one session, so variables are kept between statements.\n
+    If statements, while loops and programs are run once their end line is typed
+    '''
+    session = Session()
+    needs_more = False
+    while True:
+        try: inp = input('... ' if needs_more else '>>> ')
+        except KeyboardInterrupt: session.clear(); needs_more = False; print(); continue
+        except EOFError: print(); break
+
+        if not needs_more and inp.strip().casefold() in ('exit', 'quit'): break
+        try:
+            if not needs_more and inp.strip().startswith('load '):
+                path = get_pet_path(inp.strip().removeprefix('load ').strip())
+                if path:
+                    with open_pet(path) as source: session.run(source)
+                continue
+
+            needs_more = session.feed(inp)
+        except KeyboardInterrupt: print('repl: run interrupted')
+        except Exception as e: print(f"repl: run failed with {type(e).__name__}: {e}")
+        else: continue
+        session.clear()
+        needs_more = False
 
 
 
@@ -16,14 +129,33 @@ def main():
         if inp.casefold() in ('exit', 'quit'): break
 
         elif inp.startswith('run '):
-            path = inp.removeprefix('run ').strip()
-            if not path.endswith('.pet'): path += '.pet'
-            path = Path(path)
-            if not path.exists(): print(f"file '{str(path)}' does not exist"); continue
-            with open(path, 'rt') as f: fcontent = f.read()
-            run_pet(fcontent)
+            path, *flags = [p.strip() for p in inp.removeprefix('run ').split(' --')]
+            tracer, trace_path, parallel, stream = None, None, False, False
+            for flag in flags:
+                if flag.startswith('trace '): trace_path = flag.removeprefix('trace ').strip(); tracer = Tracer()
+                elif flag == 'parallel': parallel = True
+                elif flag == 'stream': stream = True
+                else: print(f"unknown flag '--{flag}'"); break
+            else:
+                if parallel and tracer: print("'--trace' can't be used with '--parallel'"); continue
+                if parallel and stream: print("'--stream' can't be used with '--parallel'"); continue
+                path = get_pet_path(path)
+                if not path: continue
+                if parallel:
+                    with open(path, 'rt') as f: fcontent = f.read()
+                    run_pet_parallel(fcontent)
+                else:
+                    with open_pet(path, stream) as source: run_pet(source, tracer=tracer)
+                if tracer: tracer.save(trace_path); print(f"saved trace to '{trace_path}'")
+
+        elif inp.startswith('watch '):
+            path = get_pet_path(inp.removeprefix('watch ').strip())
+            if not path: continue
+            watch(path)
+
+        elif inp == 'repl': repl()
 
 
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()